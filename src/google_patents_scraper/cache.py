@@ -0,0 +1,69 @@
+import json
+import os
+from hashlib import blake2b
+from logging import getLogger
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from .parse import Node, parse_html
+
+logger = getLogger(__name__)
+
+CACHE_VERSION = 6
+"""Part of the cache path. Bump this whenever parse_html's output changes."""
+
+
+def cache_dir() -> Path:
+    """Directory containing cached parse results."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "google-patents-scraper" / "parsed" / f"v{CACHE_VERSION}"
+
+
+def cached_parse_html(html: str) -> Node:
+    """Parse HTML string, reusing the result of a previous parse of identical HTML.
+
+    Results are stored as JSON files named by a hash of the HTML."""
+    # Page source can contain lone surrogates, which a plain encode() rejects.
+    key = blake2b(
+        html.encode("utf-8", errors="surrogatepass"), digest_size=16
+    ).hexdigest()
+    path = cache_dir() / f"{key}.json"
+    try:
+        with path.open(encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            logger.debug(f"Using cached parse result: {path}")
+            return data
+        logger.warning(f"Ignoring malformed cache entry: {path}")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError):
+        logger.warning(f"Ignoring unreadable cache entry: {path}", exc_info=True)
+
+    data = parse_html(html)
+    try:
+        write_entry(path, data)
+    except OSError:
+        logger.warning(f"Could not write cache entry: {path}", exc_info=True)
+    return data
+
+
+def write_entry(path: Path, data: Node) -> None:
+    """Write a cache entry atomically.
+
+    The entry is written to a temporary file first so that concurrent readers
+    never see a partially written entry. The temporary file is removed if
+    anything fails."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False
+    )
+    try:
+        with tmp:
+            # json.dumps() uses the C encoder, unlike json.dump() which encodes
+            # in Python so that it can write incrementally.
+            tmp.write(json.dumps(data, separators=(",", ":")))
+        os.replace(tmp.name, path)
+    except BaseException:
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
@@ -3,7 +3,6 @@ import logging
 from argparse import ArgumentParser
 
 import rich
-from bs4 import Tag
 from rich import traceback
 from rich.logging import RichHandler
 
@@ -14,9 +13,6 @@ def main() -> None:
     rich.reconfigure(stderr=True)
     log_handler = RichHandler(rich_tracebacks=True)
     traceback.install(show_locals=True)
-    # Monkeypatch BS4 Tag to not take huge amounts of screen space in
-    # rich tracebacks.
-    setattr(Tag, "__repr__", lambda s: str(type(s)))
 
     file_handler = logging.FileHandler("log.txt", mode="w")
     logging.basicConfig(
@@ -36,9 +32,14 @@ def main() -> None:
         type=str,
         help=("The Google Patent ID to fetch data for. "),
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always re-parse fetched HTML instead of reusing cached results.",
+    )
     args = parser.parse_args()
 
-    scraped = scrape(args.id)
+    scraped = scrape(args.id, use_cache=not args.no_cache)
     for translation in scraped:
         # Remove raw HTML when outputting JSON
         translation.pop("html")
@@ -1,11 +1,15 @@
-from collections.abc import Iterator
+import re
+import sys
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+from io import BytesIO
 from logging import getLogger
+from multiprocessing import Pool
 from typing import Any, TypeAlias
 
-from bs4 import BeautifulSoup, NavigableString, Tag
+from lxml import etree
 
-Field: TypeAlias = tuple[str, Any]
-FieldIterator: TypeAlias = Iterator[Field]
+Element: TypeAlias = etree._Element
 Node: TypeAlias = dict[str, Any]
 
 logger = getLogger(__name__)
@@ -13,19 +17,65 @@ logger = getLogger(__name__)
 # We define a 'property' as an HTML tag with an 'itemprop' attribute.
 
 
-def tag_string(tag: Tag) -> str:
+def tag_string(tag: Element) -> str:
     """Human-readable tag information for logging."""
-    return f"{tag.name=} {tag.attrs=} {tag.sourceline=}"
+    return f"{tag.tag=} {tag.attrib=} {tag.sourceline=}"
 
 
-def has_class(tag: Tag, class_name: str) -> bool:
-    """True if 'class_name' is one of tag's classes"""
-    classes = tag.get("class") or []
-    return class_name in classes
+def class_predicate(class_name: str) -> str:
+    """XPath predicate that is true if 'class_name' is one of a tag's classes.
 
+    Tags without a class attribute are rejected before the class list is
+    tokenized."""
+    return (
+        f"(@class and contains(concat(' ', normalize-space(@class), ' '),"
+        f" ' {class_name} '))"
+    )
+
+
+def first_match(xpath: etree.XPath, tag: Element) -> Element | None:
+    """First tag in document order matched by 'xpath', if any."""
+    matches = xpath(tag)
+    assert isinstance(matches, list)
+    if not matches:
+        return None
+    match = matches[0]
+    assert isinstance(match, etree._Element)
+    return match
+
+
+def tag_text(tag: Element) -> str | None:
+    """Text of a tag whose only content is a single string.
+
+    Like BeautifulSoup's Tag.string, we look through a lone child tag. None if
+    the tag has no text or has mixed content."""
+    if len(tag) == 0:
+        return tag.text
+    child = tag[0]
+    if len(tag) == 1 and not tag.text and not child.tail and isinstance(child.tag, str):
+        return tag_text(child)
+    return None
+
+
+def stripped_strings(tag: Element) -> Iterator[str]:
+    """Non-empty, whitespace-stripped strings within a tag."""
+    for text in tag.itertext():
+        assert isinstance(text, str)
+        if text := text.strip():
+            yield text
 
+
+def stripped_text(tag: Element) -> str:
+    """Concatenation of all stripped strings within a tag."""
+    return "".join(stripped_strings(tag))
+
+
+@lru_cache(maxsize=1024)
 def hyphenated_to_camel(hyphenated: str) -> str:
-    """Convert hyphenated-string to camelCased string."""
+    """Convert hyphenated-string to camelCased string.
+
+    Results are cached, so the converted attribute names shared by many tags are
+    also shared string objects."""
     parts = list[str]()
     for i, part in enumerate(hyphenated.split("-")):
         if i != 0:
@@ -34,101 +84,178 @@ def hyphenated_to_camel(hyphenated: str) -> str:
     return "".join(parts)
 
 
+SKIPPED_TAGS = ("script", "style", "svg")
+"""Tags whose content never contributes to parsed data."""
+
+
+def find_article(html: str) -> Element | None:
+    """Parse HTML just far enough to extract the first <article> tag.
+
+    The document is parsed incrementally, and parsing stops once that article
+    ends; any articles nested inside it are included. Contents of SKIPPED_TAGS
+    are discarded as soon as they are parsed. Lone surrogates, which can appear
+    in page source obtained through Selenium, are replaced with '?'."""
+    events = etree.iterparse(
+        BytesIO(html.encode("utf-8", errors="replace")),
+        events=("start", "end"),
+        tag=("article", *SKIPPED_TAGS),
+        html=True,
+        encoding="utf-8",
+    )
+    article: Element | None = None
+    try:
+        for event, element in events:
+            assert isinstance(element, etree._Element)
+            if element.tag == "article":
+                if article is None:
+                    article = element
+                elif event == "end" and element is article:
+                    return article
+            elif event == "end":
+                # Drop the content, but not the tail, which belongs to the
+                # parent.
+                element.text = None
+                del element[:]
+    except etree.XMLSyntaxError:
+        # Only raised for documents with no content at all.
+        pass
+    return article
+
+
 def parse_html(html: str) -> Node:
     """Parse HTML string"""
-    hack.clear()
-
-    soup = BeautifulSoup(html, features="html.parser")
-    article = soup.find("article")
-    if not isinstance(article, Tag):
+    article = find_article(html)
+    if article is None:
         raise ValueError("Could not find <article> tag. Maybe the URL is wrong?")
 
     data: Node = {}
-    parse_properties(article, data)
-
-    hack.clear()
-    # Special sections get incorrectly nested under the "links" property. Remove
-    # these properties to move them to the proper location, and also to
-    # specialize their handling.
-    #
-    # TODO(dhrosa): Figure out how to avoid these nesting under "links". Perhaps
-    # pre-process the HTML to nest the special sections under a new synthethic
-    # property.
-    if links := data.get("links"):
-        for name in SPECIAL_SECTION_NAMES:
-            if name in links:
-                del links[name]
+    parse_properties([article], data)
     parse_special_sections(article, data)
 
     data["parsedPublicationNumbers"] = list(parse_publication_numbers(article))
     return data
 
 
-hack = set[int]()
+def parse_many(
+    htmls: Iterable[str], processes: int | None = None, chunksize: int | None = None
+) -> list[Node]:
+    """Parse several HTML strings in parallel worker processes.
+
+    Results are in the same order as 'htmls'. 'processes' defaults to the number
+    of CPUs. 'chunksize' is the number of documents sent to a worker at a time;
+    by default it is chosen from the number of documents and processes."""
+    with Pool(processes) as pool:
+        return pool.map(parse_html, htmls, chunksize)
+
+
+START_TAGS = frozenset({"dt", "h2"})
+
 
-START_TAGS = ("dt", "h2")
+WorkItem: TypeAlias = tuple[Element, Node, Node | None]
+"""A tag to parse, the node to parse it into, and for labels, the label's node."""
 
 
-def parse_properties(tag: Tag, current_node: Node) -> None:  # noqa: C901
-    """Recursively parse properties.
+def push_siblings(stack: list[WorkItem], tags: Iterable[Element], node: Node) -> None:
+    """Push work items for a run of sibling tags onto the parse_properties stack.
+
+    Tags following a label are routed into a new node for that label, which is
+    attached to 'node' when the label itself is popped. Items are pushed in
+    reverse so that they are popped in document order."""
+    items = list[WorkItem]()
+    current_node = node
+    for tag in tags:
+        if tag.tag in START_TAGS:
+            current_node = {}
+            items.append((tag, node, current_node))
+        else:
+            items.append((tag, current_node, None))
+    stack.extend(reversed(items))
+
+
+def parse_properties(tags: Iterable[Element], current_node: Node) -> None:
+    """Parse properties within the given sibling tags into 'current_node'.
 
     We skip over tags that are not related to a property.
 
     <dt> and <h2> tags are used as labels that delineate properties. Nodes
     between these tags relate to the previous label.
+
+    The tree is walked depth-first with an explicit stack rather than recursion.
+    Each run of siblings is swept once by push_siblings(), so every tag is
+    visited exactly once.
     """
-    if id(tag) in hack:
-        return
-    hack.add(id(tag))
-    child_node: Node
-    if tag.name in START_TAGS:
-        # New label found; begin a new nested node
-        label = parse_label(tag)
-        child_node = {}
-        parse_siblings_properties(tag, child_node)
-        current_node[label] = child_node
-        return
+    stack = list[WorkItem]()
+    push_siblings(stack, tags, current_node)
+    while stack:
+        tag, current_node, label_node = stack.pop()
+        if label_node is not None:
+            # Label found; its siblings have already been routed into its node.
+            current_node[parse_label(tag)] = label_node
+            continue
 
-    property_name = tag.get("itemprop")
-    if not property_name:
-        # This tag itself is not a property, but its descendants might be
-        parse_children_properties(tag, current_node)
-        return
-    assert isinstance(property_name, str)
+        property_name = tag.get("itemprop")
+        if property_name in SPECIAL_SECTION_NAMES and is_special_section(tag):
+            # Parsed separately by parse_special_sections(). Skipping them here
+            # also keeps them from being nested under whichever label precedes
+            # them (typically "links").
+            continue
+        if not property_name:
+            # This tag itself is not a property, but its descendants might be
+            push_siblings(stack, tag.iterchildren(etree.Element), current_node)
+            continue
+        # The same few property names occur throughout every page; share one
+        # string object per name between all the nodes using it as a key.
+        property_name = sys.intern(property_name)
 
-    value = property_value(tag)
+        value: Any
+        if "itemscope" in tag.attrib:
+            # Nested property
+            child_node: Node = {}
+            push_siblings(stack, tag.iterchildren(etree.Element), child_node)
+            value = child_node
+        else:
+            value = property_value(tag)
 
-    if tag.has_attr("repeat"):
-        # "repeat" attribute indicate list-valued properties
-        if property_name not in current_node:
-            current_node[property_name] = []
-        current_node[property_name].append(value)
-    else:
-        # Scalar property
-        current_node[property_name] = value
+        if "repeat" in tag.attrib:
+            # "repeat" attribute indicate list-valued properties
+            if property_name not in current_node:
+                current_node[property_name] = []
+            current_node[property_name].append(value)
+        else:
+            # Scalar property
+            current_node[property_name] = value
 
 
-def property_value(tag: Tag) -> Any:
-    """Parse value of a property tag.
+VALUE_ATTRIBUTES = {
+    "meta": "content",
+    "a": "href",
+    "link": "href",
+    "img": "src",
+}
+"""Attribute holding a property's value, keyed by the property's tag name.
+
+Only this attribute is considered for these tags, e.g. an <a> tag's value is its
+href even if it also has a content attribute."""
+
+
+def property_value(tag: Element) -> Any:
+    """Parse value of a non-nested property tag.
 
     Dependent on the type of tag, the interesting content of the tag"""
-    if tag.has_attr("itemscope"):
-        # Nested property
-        child_node: Node = {}
-        parse_children_properties(tag, child_node)
-        return child_node
-    if (content := tag.get("content")) is not None:
-        # <meta> tags
+    attribute = VALUE_ATTRIBUTES.get(tag.tag)
+    if attribute is not None:
+        if (value := tag.get(attribute)) is not None:
+            return value
+    # Other tags may carry any of these attributes, in order of precedence
+    elif (content := tag.get("content")) is not None:
         return content
-    if (href := tag.get("href")) is not None:
-        # <a> tags
+    elif (href := tag.get("href")) is not None:
         return href
-    if (src := tag.get("src")) is not None:
-        # <img> tags
+    elif (src := tag.get("src")) is not None:
         return src
     # Otherwise, the text within the node is considered the value
-    text = tag.string
-    if not isinstance(text, str):
+    text = tag_text(tag)
+    if text is None:
         #
         logger.warning(
             f"Omitting property value for tag with nested content: {tag_string(tag)}"
@@ -137,64 +264,55 @@ def property_value(tag: Tag) -> Any:
     return text.strip()
 
 
-def attrs_to_fields(tag: Tag) -> FieldIterator:
+def attrs_to_node(tag: Element) -> Node:
     """Convert all HTML attributes of a tag into fields except for 'class'."""
-    for key, value in tag.attrs.items():
-        if key != "class":
-            yield hyphenated_to_camel(key), value
+    return {
+        hyphenated_to_camel(str(key)): value
+        for key, value in tag.attrib.items()
+        if key != "class"
+    }
 
 
-def parse_label(tag: Tag) -> str:
+def parse_label(tag: Element) -> str:
     """Convert a label (e.g. an h2 tag) into camel case."""
-    raw = tag.string
-    if not isinstance(raw, str):
+    raw = tag_text(tag)
+    if raw is None:
         logger.warning("Label tag has no string")
         return ""
-    raw = raw.strip()
+    return label_to_camel(raw.strip())
 
-    parts = list[str]()
-    for i, part in enumerate(raw.split()):
-        if not part[0].isalnum():
-            break
-        if i == 0:
-            parts.append(part.lower())
-        else:
-            parts.append(part.capitalize())
-    return "".join(parts)
 
+LABEL_WORDS = re.compile(r"[^\W_]\S*(?:\s+[^\W_]\S*)*")
+"""Leading run of words that start with an alphanumeric character."""
 
-def parse_children_properties(tag: Tag, current_node: Node) -> None:
-    """Parse properties from all child tags"""
-    for child in tag.children:
-        if not isinstance(child, Tag):
-            continue
-        parse_properties(child, current_node)
 
+@lru_cache(maxsize=1024)
+def label_to_camel(label: str) -> str:
+    """Convert label text into camel case.
 
-def parse_siblings_properties(tag: Tag, current_node: Node) -> None:
-    """Parse properties from all sibling tags"""
-    for sibling in tag.next_siblings:
-        if not isinstance(sibling, Tag):
-            continue
-        if sibling.name in START_TAGS:
-            return
-        parse_properties(sibling, current_node)
+    Words after the first one that doesn't start with an alphanumeric character
+    (e.g. a count like "(12)") are dropped.
 
+    The same few labels appear on every patent page, so results are cached."""
+    match = LABEL_WORDS.match(label)
+    if match is None:
+        return ""
+    first, *rest = match.group().split()
+    return first.lower() + "".join(word.capitalize() for word in rest)
 
-def parse_publication_numbers(article: Tag) -> Iterator[str]:
-    start = article.find(attrs={"itemprop": "publicationNumber"})
-    if not isinstance(start, Tag):
+
+def parse_publication_numbers(article: Element) -> Iterator[str]:
+    start = article.find(".//*[@itemprop='publicationNumber']")
+    if start is None:
         logger.warning("Could not find publication numbers.")
         return
 
-    for sibling in start.next_siblings:
-        if not isinstance(sibling, Tag):
-            continue
-        if sibling.name in START_TAGS:
+    for sibling in start.itersiblings(etree.Element):
+        if sibling.tag in START_TAGS:
             return
-        if sibling.name != "span":
+        if sibling.tag != "span":
             continue
-        text = sibling.get_text(strip=True)
+        text = stripped_text(sibling)
         if text:
             yield text
 
@@ -209,139 +327,172 @@ SPECIAL_SECTION_NAMES = (
 """itemprop value of <section> tags that need specialized handling."""
 
 
-def is_special_section(tag: Tag) -> bool:
+def is_special_section(tag: Element) -> bool:
     """True if this is a <section> tag that needs specialized handling."""
     return (
-        tag.name == "section"
-        and tag.has_attr("itemscope")
-        and (tag.get("itemprop") in SPECIAL_SECTION_NAMES)
+        tag.tag == "section"
+        and "itemscope" in tag.attrib
+        and tag.get("itemprop") in SPECIAL_SECTION_NAMES
+    )
+
+
+find_special_sections = etree.XPath(
+    ".//section[@itemscope][{}]".format(
+        " or ".join(f"@itemprop='{name}'" for name in SPECIAL_SECTION_NAMES)
     )
+)
+"""Finds <section> tags that need specialized handling."""
 
 
-def parse_special_sections(article: Tag, current_node: Node) -> None:
+def parse_special_sections(article: Element, current_node: Node) -> None:
     """Parse section tags that are also properties.
 
     These tags have special structure that is not represented as properties."""
-    for section in article.find_all(is_special_section):
-        property_name = section["itemprop"]
+    sections = find_special_sections(article)
+    assert isinstance(sections, list)
+    for section in sections:
+        assert isinstance(section, etree._Element)
+        property_name = section.get("itemprop")
         assert isinstance(property_name, str)
+        property_name = sys.intern(property_name)
         value: Any
         match property_name:
             case "abstract":
-                value = dict(parse_abstract(section))
+                value = parse_abstract(section)
             case "description":
-                value = dict(parse_description(section))
+                value = parse_description(section)
             case "claims":
-                value = dict(parse_claims(section))
+                value = parse_claims(section)
             case "application":
-                value = dict(parse_application(section))
+                value = parse_application(section)
             case "family":
-                value = dict(parse_family(section))
+                value = parse_family(section)
             case _:
-                logger.warning(f"Unhandled section: {section.attrs=}")
+                logger.warning(f"Unhandled section: {section.attrib=}")
                 value = None
         current_node[property_name] = value
 
 
-def parse_abstract(section: Tag) -> FieldIterator:
+def parse_abstract(section: Element) -> Node:
     """Parse abstract section"""
-    abstract = section.find("abstract")
-    if not isinstance(abstract, Tag):
-        return
-
-    yield from attrs_to_fields(abstract)
-    yield "text", abstract.get_text(strip=True)
+    abstract = section.find(".//abstract")
+    if abstract is None:
+        return {}
 
+    return {**attrs_to_node(abstract), "text": stripped_text(abstract)}
 
-def parse_description(section: Tag) -> FieldIterator:
-    """Parse description section"""
-
-    def is_description(tag: Tag) -> bool:
-        return has_class(tag, "description") or (tag.name == "description")
 
-    description = section.find(is_description)
-    if not isinstance(description, Tag):
-        return
+find_description = etree.XPath(
+    f"(.//*[self::description or {class_predicate('description')}])[1]"
+)
 
-    yield from attrs_to_fields(description)
 
-    yield "lines", list(parse_description_lines(description))
+def parse_description(section: Element) -> Node:
+    """Parse description section"""
+    description = first_match(find_description, section)
+    if description is None:
+        return {}
 
+    return {
+        **attrs_to_node(description),
+        "lines": list(parse_description_lines(description)),
+    }
 
-def descendant_navigable_strings(tag: Tag) -> Iterator[NavigableString]:
-    """Iterates through NavigableString descendants of the given tag."""
-    for d in tag.descendants:
-        if isinstance(d, NavigableString):
-            yield d
 
+def parse_description_lines(description: Element) -> Iterator[Node]:
+    """Parse individual text elements inside the description section.
 
-def parse_description_lines(description: Tag) -> Iterator[Node]:
-    """Parse individual text elements inside the description section."""
+    HTML comments are not content and are omitted. (With BeautifulSoup, comment
+    text used to be emitted as lines, since its Comment is a NavigableString.)
 
-    def get_line_num(s: NavigableString) -> str:
-        """Fetches the "num" attribute of the nearest ancestor."""
-        for parent in s.parents:
-            if num := parent.get("num"):
-                assert isinstance(num, str)
-                return num
-        return ""
+    Each string is numbered by the "num" attribute of its nearest enclosing tag.
+    Rather than searching ancestors for every string, we keep a stack of the
+    enclosing numbers as we walk the tree."""
+    outer_num = ""
+    for ancestor in description.iterancestors():
+        if num := ancestor.get("num"):
+            outer_num = num
+            break
+    nums = [outer_num]
+
+    events = ("start", "end", "comment")
+    for event, element in etree.iterwalk(description, events=events):
+        match event:
+            case "start":
+                nums.append(element.get("num") or nums[-1])
+                s = element.text
+            case "end":
+                nums.pop()
+                if element is description:
+                    # The description's tail is outside of the description.
+                    continue
+                # The tail of a tag belongs to its parent.
+                s = element.tail
+            case _:
+                # Comment text is not content, but its tail is.
+                s = element.tail
+        if s and (text := s.strip()):
+            yield {"num": nums[-1], "text": text}
 
-    for d in descendant_navigable_strings(description):
-        text = str(d).strip()
-        if not text:
-            continue
-        yield {"num": get_line_num(d), "text": text}
 
+find_claims_tag = etree.XPath(f"(.//*[self::claims or {class_predicate('claims')}])[1]")
 
-def parse_claims(section: Tag) -> FieldIterator:
-    """Parse claims section"""
+# Test the "num" attribute first so only numbered tags have their classes
+# checked.
+IS_CLAIM_PREDICATE = f"@num and (self::claim or {class_predicate('claim')})"
 
-    def is_claims(tag: Tag) -> bool:
-        return has_class(tag, "claims") or tag.name == "claims"
+find_claims = etree.XPath(
+    f".//*[{IS_CLAIM_PREDICATE}][not(ancestor::*[{IS_CLAIM_PREDICATE}])]"
+)
+"""Finds outermost claims. Nested claims are part of their enclosing claim's text."""
 
-    claims_tag = section.find(is_claims)
-    if not isinstance(claims_tag, Tag):
-        return
 
-    yield from attrs_to_fields(claims_tag)
+def parse_claims(section: Element) -> Node:
+    """Parse claims section"""
+    claims_tag = first_match(find_claims_tag, section)
+    if claims_tag is None:
+        return {}
 
     parsed_claims = list[Node]()
+    claims = find_claims(claims_tag)
+    assert isinstance(claims, list)
+    for claim in claims:
+        assert isinstance(claim, etree._Element)
+        parsed_claims.append(parse_claim(claim))
 
-    def is_claim(tag: Tag) -> bool:
-        return (has_class(tag, "claim") or tag.name == "claim") and tag.has_attr("num")
-
-    for claim in claims_tag.find_all(is_claim):
-        assert isinstance(claim, Tag)
-        parsed_claims.append(dict(parse_claim(claim)))
-
-    yield "claims", parsed_claims
+    return {**attrs_to_node(claims_tag), "claims": parsed_claims}
 
 
-def parse_claim(claim: Tag) -> FieldIterator:
+def parse_claim(claim: Element) -> Node:
     """Parse a single claim"""
-    yield from attrs_to_fields(claim)
-    yield "text", list(claim.stripped_strings)
+    return {**attrs_to_node(claim), "text": list(stripped_strings(claim))}
 
 
-def parse_application(application: Tag) -> FieldIterator:
+def parse_application(application: Element) -> Node:
     """Parse application section."""
     node: Node = {}
-    parse_children_properties(application, node)
-    yield from node.items()
+    parse_properties(application.iterchildren(etree.Element), node)
+    return node
 
 
-def parse_family(family: Tag) -> FieldIterator:
+def parse_family(family: Element) -> Node:
     """Parse family section."""
-    # The ID of the family is contained in its first h2 tag.
-    id_tag = family.find("h2")
-    if not isinstance(id_tag, Tag):
-        return
-    yield "id", id_tag.get_text(strip=True).split("=")[-1]
-
-    content_start = id_tag.find_next_sibling("h2")
-    if not isinstance(content_start, Tag):
-        return
-
     node: Node = {}
-    parse_properties(content_start, node)
-    yield from node.items()
+    # The ID of the family is contained in its first h2 tag.
+    id_tag = family.find(".//h2")
+    if id_tag is None:
+        return node
+    node["id"] = stripped_text(id_tag).split("=")[-1]
+
+    content_start = next(id_tag.itersiblings("h2"), None)
+    if content_start is None:
+        return node
+
+    # Only the content belonging to that label is parsed.
+    content = [content_start]
+    for sibling in content_start.itersiblings(etree.Element):
+        if sibling.tag in START_TAGS:
+            break
+        content.append(sibling)
+    parse_properties(content, node)
+    return node
@@ -1,5 +1,6 @@
 from logging import getLogger
 
+from .cache import cached_parse_html
 from .fetch import fetch_html
 from .parse import Node, parse_html
 
@@ -11,16 +12,18 @@ def patent_url(patent_id: str, language: str) -> str:
     return f"https://patents.google.com/patent/{patent_id}/{language}"
 
 
-def scrape(patent_id: str) -> list[Node]:
+def scrape(patent_id: str, use_cache: bool = True) -> list[Node]:
     """Scrape information for the given patent ID.
 
-    We produce one element for every language the patent is available in.
+    We produce one element for every language the patent is available in. If
+    'use_cache' is set, parse results are cached on disk by a hash of the HTML.
     """
+    parse = cached_parse_html if use_cache else parse_html
     original_url = patent_url(patent_id, "")
     logger.info(f"Parsing patent in its original language: {original_url}")
     # Fetch patent HTML for the original language.
     original_html = fetch_html(original_url)
-    original = parse_html(original_html)
+    original = parse(original_html)
     try:
         original_language = original["abstract"]["lang"].lower()
     except KeyError:
@@ -44,7 +47,7 @@ def scrape(patent_id: str) -> list[Node]:
         url = patent_url(patent_id, language)
         logger.info(f"Fetching {language!r} translation: {url}")
         html = fetch_html(url)
-        parsed.append({"language": language, "data": parse_html(html), "html": html})
+        parsed.append({"language": language, "data": parse(html), "html": html})
 
     logger.info("Scrape completed.")
     return parsed
@@ -0,0 +1,86 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from google_patents_scraper import cache, parse
+
+HTML = '<html><body><article><span itemprop="title">Cat toy</span></article>'
+
+
+@pytest.fixture
+def parse_calls(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Points the cache at a temporary directory and records calls to parse_html."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    calls = list[str]()
+    parse_html = parse.parse_html
+
+    def recording_parse_html(html: str) -> parse.Node:
+        calls.append(html)
+        return parse_html(html)
+
+    monkeypatch.setattr(cache, "parse_html", recording_parse_html)
+    return calls
+
+
+def entry_path() -> Path:
+    entries = list(cache.cache_dir().iterdir())
+    assert len(entries) == 1
+    return entries[0]
+
+
+def test_round_trip(parse_calls: list[str]) -> None:
+    first = cache.cached_parse_html(HTML)
+    second = cache.cached_parse_html(HTML)
+
+    assert first == second == parse.parse_html(HTML)
+    assert first["title"] == "Cat toy"
+    assert parse_calls == [HTML]
+    assert entry_path().suffix == ".json"
+
+
+def test_different_html_misses(parse_calls: list[str]) -> None:
+    cache.cached_parse_html(HTML)
+    cache.cached_parse_html(HTML.replace("Cat", "Dog"))
+
+    assert len(parse_calls) == 2
+    assert len(list(cache.cache_dir().iterdir())) == 2
+
+
+def test_lone_surrogate(parse_calls: list[str]) -> None:
+    html = HTML.replace("Cat", "C\ud83dt")
+    cache.cached_parse_html(html)
+
+    assert cache.cached_parse_html(html)["title"] == "C?t toy"
+    assert parse_calls == [html]
+
+
+def test_malformed_entry_is_replaced(parse_calls: list[str]) -> None:
+    cache.cached_parse_html(HTML)
+    entry_path().write_text(json.dumps(["not", "a", "node"]))
+
+    assert cache.cached_parse_html(HTML)["title"] == "Cat toy"
+    assert len(parse_calls) == 2
+    assert json.loads(entry_path().read_text())["title"] == "Cat toy"
+
+
+def test_unreadable_entry_is_replaced(parse_calls: list[str]) -> None:
+    cache.cached_parse_html(HTML)
+    entry_path().write_text("{truncated")
+
+    assert cache.cached_parse_html(HTML)["title"] == "Cat toy"
+    assert len(parse_calls) == 2
+    assert json.loads(entry_path().read_text())["title"] == "Cat toy"
+
+
+def test_write_failure_leaves_no_temporary_file(
+    parse_calls: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def failing_replace(src: str, dst: str) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+
+    assert cache.cached_parse_html(HTML)["title"] == "Cat toy"
+    assert list(cache.cache_dir().iterdir()) == []
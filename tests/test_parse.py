@@ -0,0 +1,70 @@
+import json
+from pathlib import Path
+
+from google_patents_scraper.parse import Node, parse_html, parse_many
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def parse_article(content: str) -> Node:
+    return parse_html(f"<html><body><article>{content}</article></body></html>")
+
+
+def test_property_value_by_tag_name() -> None:
+    data = parse_article(
+        '<meta itemprop="meta" content="m" href="/m">'
+        '<a itemprop="link" href="/x" content="c">text</a>'
+        '<img itemprop="image" src="i.png">'
+        '<a itemprop="anchor">anchor text</a>'
+        '<span itemprop="span" href="/s" content="c">text</span>'
+        '<time itemprop="date">2001-01-01</time>'
+    )
+    assert data["meta"] == "m"
+    # Tags with a dedicated attribute only use that attribute...
+    assert data["link"] == "/x"
+    assert data["image"] == "i.png"
+    # ...and otherwise their text.
+    assert data["anchor"] == "anchor text"
+    # Other tags prefer content, then href, then src, then text.
+    assert data["span"] == "c"
+    assert data["date"] == "2001-01-01"
+
+
+def test_nested_articles() -> None:
+    data = parse_article(
+        '<span itemprop="a">1</span>'
+        '<article><span itemprop="b">2</span></article>'
+        '<span itemprop="c">3</span>'
+    )
+    assert (data["a"], data["b"], data["c"]) == ("1", "2", "3")
+
+
+def test_skipped_tag_content_is_ignored() -> None:
+    data = parse_article(
+        '<section itemprop="description" itemscope><div class="description">'
+        "Text<script>var x;</script> tail"
+        "<svg><text>Fig. 1</text></svg> end</div></section>"
+    )
+    lines = [line["text"] for line in data["description"]["lines"]]
+    assert lines == ["Text", "tail", "end"]
+
+
+def test_lone_surrogate() -> None:
+    data = parse_article('<span itemprop="title">a\ud83db</span>')
+    assert data["title"] == "a?b"
+
+
+def test_parse_many() -> None:
+    page_a = (DATA_DIR / "page.html").read_text(encoding="utf-8")
+    page_b = '<html><body><article><span itemprop="title">B</span></article>'
+    htmls = [page_a, page_b, page_a]
+    assert parse_many(htmls, processes=2) == [parse_html(html) for html in htmls]
+
+
+def test_page() -> None:
+    """Full parse of a synthetic patent page, compared with its known output.
+
+    The JSON text is compared so that key order is checked as well."""
+    html = (DATA_DIR / "page.html").read_text(encoding="utf-8")
+    expected = (DATA_DIR / "page.json").read_text(encoding="utf-8")
+    assert json.dumps(parse_html(html), indent=2, ensure_ascii=False) + "\n" == expected